@@ -1,41 +1,88 @@
-import base64
+import csv
+import datetime
+import io
+import json
+import logging
 import time
+import uuid
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List
-import io
-import zipfile
+from sqlalchemy import insert
 from app.services.processing import process_files
 from app.services.ml_engine import clustering_pipeline, generate_dataset_summary
+from app.services.archive import stream_zip
 from app.models.metadata import DocumentMetadata
 from app.core.database import SessionLocal
+from app.core.cache import redis_client
+from app.core.workers import process_pool
 
 router = APIRouter()
 
+# Analysis results are kept just long enough for the client to fetch them
+ANALYSIS_TTL_SEC = 3600
+
+# Batches larger than this are written with COPY instead of ORM inserts
+COPY_THRESHOLD = 50
+
+METADATA_COLUMNS = (
+    "id", "filename", "file_size_kb", "file_type", "page_count", "language",
+    "cluster_label", "x_coord", "y_coord", "processed_at"
+)
+
+def copy_metadata(db, organized_data: List[dict]):
+    """Bulk load rows through PostgreSQL COPY ... FROM STDIN (CSV, empty field = NULL)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    processed_at = datetime.datetime.utcnow().isoformat()
+    for item in organized_data:
+        meta = item.get("metadata", {})
+        writer.writerow([
+            uuid.uuid4(),
+            item["filename"],
+            meta.get("file_size_kb"),
+            meta.get("file_type"),
+            meta.get("page_count"),
+            meta.get("language", "en"),
+            item["folder"],
+            item.get("x"),
+            item.get("y"),
+            processed_at
+        ])
+    buf.seek(0)
+
+    raw = db.connection().connection
+    with raw.cursor() as cur:
+        cur.copy_expert(
+            f"COPY {DocumentMetadata.__tablename__} ({', '.join(METADATA_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buf
+        )
+
 async def save_metadata(organized_data: List[dict]):
     db = SessionLocal()
     try:
-        for item in organized_data:
-            meta = item.get("metadata", {})
-            metadata = DocumentMetadata(
-                filename=item["filename"],
-                cluster_label=item["folder"],
-                file_size_kb=meta.get("file_size_kb"),
-                file_type=meta.get("file_type"),
-                page_count=meta.get("page_count"),
-                language=meta.get("language", "en"),
-                x_coord=item.get("x"),
-                y_coord=item.get("y")
-            )
-            db.add(metadata)
+        if len(organized_data) > COPY_THRESHOLD:
+            copy_metadata(db, organized_data)
+        elif organized_data:
+            # Core executemany insert (insertmanyvalues) skips per-object unit-of-work bookkeeping
+            rows = []
+            for item in organized_data:
+                meta = item.get("metadata", {})
+                rows.append({
+                    "filename": item["filename"],
+                    "cluster_label": item["folder"],
+                    "file_size_kb": meta.get("file_size_kb"),
+                    "file_type": meta.get("file_type"),
+                    "page_count": meta.get("page_count"),
+                    "language": meta.get("language", "en"),
+                    "x_coord": item.get("x"),
+                    "y_coord": item.get("y")
+                })
+            db.execute(insert(DocumentMetadata), rows)
         db.commit()
     finally:
         db.close()
 
-import logging
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 @router.post("/upload")
@@ -44,74 +91,93 @@ async def upload_documents(background_tasks: BackgroundTasks, files: List[Upload
         raise HTTPException(status_code=400, detail="No files uploaded")
     
     start_time = time.time()
-    logger.info(f"Starting upload of {len(files)} files")
+    # Per-phase timing is only formatted when debug logging is on
+    debug_timing = logger.isEnabledFor(logging.DEBUG)
+    if debug_timing:
+        logger.debug(f"Starting upload of {len(files)} files")
     
-    # Process files in memory
+    # Spool and process files
     t0 = time.time()
     processed_data = await process_files(files)
-    t1 = time.time()
-    logger.info(f"File processing took {t1 - t0:.2f}s")
+    if debug_timing:
+        logger.debug(f"File processing took {time.time() - t0:.2f}s")
     
     # ML Pipeline: Embed, Reduce, Cluster, Label
     t2 = time.time()
     organized_data = await clustering_pipeline(processed_data)
-    t3 = time.time()
-    logger.info(f"ML Pipeline took {t3 - t2:.2f}s")
-    
-    processing_time = round(time.time() - start_time, 2)
+    if debug_timing:
+        logger.debug(f"ML Pipeline took {time.time() - t2:.2f}s")
     
-    # Calculate Stats
+    # Calculate stats, analysis results and zip entries in a single pass
     t4 = time.time()
+    total_size_kb = 0
+    largest_file_kb = 0
+    unique_clusters = set()
+    analysis_results = []
+    zip_entries = []
+    for item in organized_data:
+        meta = item["metadata"]
+        size_kb = meta["file_size_kb"]
+        total_size_kb += size_kb
+        if size_kb > largest_file_kb:
+            largest_file_kb = size_kb
+        unique_clusters.add(item["folder"])
+        analysis_results.append({
+            "filename": item["filename"],
+            "folder": item["folder"],
+            "x": item.get("x", 0),
+            "y": item.get("y", 0),
+            "metadata": meta
+        })
+        zip_entries.append((f"{item['folder']}/{item['filename']}", item["content"]))
+
     total_files = len(organized_data)
-    total_size_kb = sum(d["metadata"]["file_size_kb"] for d in organized_data)
-    largest_file_kb = max(d["metadata"]["file_size_kb"] for d in organized_data) if organized_data else 0
     avg_size_kb = round(total_size_kb / total_files, 1) if total_files else 0
-    unique_clusters = list(set(d["folder"] for d in organized_data))
     
     # Generate Semantic Summary
     dataset_description = await generate_dataset_summary(organized_data)
-    t5 = time.time()
-    logger.info(f"Stats & Summary took {t5 - t4:.2f}s")
+    if debug_timing:
+        logger.debug(f"Stats & Summary took {time.time() - t4:.2f}s")
     
     # Save metadata in background
     background_tasks.add_task(save_metadata, organized_data)
     
-    # Zip organized files in memory
-    t6 = time.time()
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
-        for item in organized_data:
-            zip_file.writestr(f"{item['folder']}/{item['filename']}", item['content'])
-    
-    zip_buffer.seek(0)
-    zip_base64 = base64.b64encode(zip_buffer.getvalue()).decode("utf-8")
-    t7 = time.time()
-    logger.info(f"Zipping took {t7 - t6:.2f}s")
-    
     processing_time = round(time.time() - start_time, 2)
-    logger.info(f"Total request processed in {processing_time}s")
+    if debug_timing:
+        logger.debug(f"Total request processed in {processing_time}s")
     
-    # Prepare response data 
-    analysis_results = []
-    for item in organized_data:
-        analysis_results.append({
-            "filename": item["filename"],
-            "folder": item["folder"],
-            "x": item.get("x", 0),
-            "y": item.get("y", 0),
-            "metadata": item.get("metadata", {})
-        })
+    # Persist analysis for the client to fetch once the zip download has started
+    analysis_id = uuid.uuid4().hex
+    await redis_client.set(
+        f"analysis:{analysis_id}",
+        json.dumps({
+            "analysis": analysis_results,
+            "summary": {
+                "total_files": total_files,
+                "total_size_kb": total_size_kb,
+                "avg_size_kb": avg_size_kb,
+                "largest_file_kb": largest_file_kb,
+                "processing_time_sec": processing_time,
+                "cluster_count": len(unique_clusters),
+                "description": dataset_description
+            }
+        }),
+        ex=ANALYSIS_TTL_SEC
+    )
 
-    return JSONResponse(content={
-        "analysis": analysis_results,
-        "zip_file": zip_base64,
-        "summary": {
-            "total_files": total_files,
-            "total_size_kb": total_size_kb,
-            "avg_size_kb": avg_size_kb,
-            "largest_file_kb": largest_file_kb,
-            "processing_time_sec": processing_time,
-            "cluster_count": len(unique_clusters),
-            "description": dataset_description
+    # Stream organized files as a zip, deflating entries in parallel worker processes
+    return StreamingResponse(
+        stream_zip(zip_entries, process_pool),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=organized_documents.zip",
+            "X-Analysis-Url": f"/api/analysis/{analysis_id}"
         }
-    })
+    )
+
+@router.get("/analysis/{analysis_id}")
+async def get_analysis(analysis_id: str):
+    payload = await redis_client.get(f"analysis:{analysis_id}")
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Analysis not found or expired")
+    return JSONResponse(content=json.loads(payload))
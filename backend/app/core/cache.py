@@ -0,0 +1,5 @@
+import redis.asyncio as redis
+from app.core.config import settings
+
+# Shared async Redis client (connection pool is created lazily on first use)
+redis_client = redis.from_url(settings.REDIS_URL)
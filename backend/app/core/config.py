@@ -1,9 +1,18 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "postgresql://user:password@db:5432/db"
     REDIS_URL: str = "redis://redis:6379/0"
     OPENROUTER_API_KEY: str = "dummy"
+    # Worker processes for CPU-bound parsing/compression (default: usable CPUs)
+    WORKER_PROCESSES: Optional[int] = None
+    # Documents in flight at once (default: twice the worker processes)
+    DOC_CONCURRENCY: Optional[int] = None
+    # Concurrent OCR requests to OpenRouter
+    API_CONCURRENCY: int = 8
+    # Comma-separated langdetect profiles to load when gcld3 is unavailable
+    LANGDETECT_LANGUAGES: str = "en,nl,es,ar,fr,de,it,pt,ru,ja,ko,zh-cn,zh-tw,hi,bn,id"
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,10 @@
+import httpx
+
+# Shared keep-alive HTTP/2 client for all OpenRouter traffic, so concurrent
+# embedding/labelling/OCR calls multiplex over a few TLS connections
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=256, max_keepalive_connections=128),
+    # Batched OCR replies can take well over 30s to generate
+    timeout=60.0,
+)
@@ -0,0 +1,16 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from app.core.config import settings
+
+
+def _usable_cpus() -> int:
+    # Respects CPU affinity (e.g. container cpusets), unlike os.cpu_count()
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Shared pool for CPU-bound work that would otherwise hold the GIL.
+# Worker processes are only spawned on first submit.
+POOL_WORKERS = settings.WORKER_PROCESSES or _usable_cpus()
+process_pool = ProcessPoolExecutor(max_workers=POOL_WORKERS)
@@ -2,17 +2,23 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import upload
 from app.core.database import init_db
+from app.core.workers import process_pool
+from app.core.http import http_client
 from contextlib import asynccontextmanager
+import logging
 import os
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
     key = os.getenv("OPENROUTER_API_KEY", "")
     print(f"DEBUG: OPENROUTER_API_KEY loaded: {key[:5]}... (len={len(key)})")
     init_db()
     yield
-    # Shutdown (if needed)
+    # Shutdown
+    process_pool.shutdown(wait=False, cancel_futures=True)
+    await http_client.aclose()
 
 app = FastAPI(
     title="Intelligent Document Management System",
@@ -27,6 +33,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Analysis-Url"],
 )
 
 app.include_router(upload.router, prefix="/api")
@@ -0,0 +1,184 @@
+import asyncio
+import queue
+import struct
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import AsyncIterator, BinaryIO, Iterable, Tuple
+from app.services.spool import CHUNK_SIZE, read_spool
+
+try:
+    # ISA-L: SIMD DEFLATE and CRC32 with a zlib-compatible API and output
+    from isal import isal_zlib as zlib
+    DEFLATE_LEVEL = 1  # ISA-L levels are 0-3
+except ImportError:
+    import zlib
+    DEFLATE_LEVEL = 6
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# Containers whose payload is already compressed; deflating them again costs CPU for ~0% gain
+STORED_EXTENSIONS = (".pdf", ".docx", ".zip", ".jpg", ".jpeg", ".png", ".webp", ".mp4", ".gz")
+
+# Deflate jobs submitted ahead of the entry currently being streamed
+DEFLATE_LOOKAHEAD = 16
+
+# BFINAL=1, fixed-Huffman block holding only the end-of-block code
+_FINAL_EMPTY_BLOCK = b"\x03\x00"
+
+# Per-process pool of reusable deflaters (avoids allocating zlib state per entry)
+_DEFLATER_POOL = queue.LifoQueue()
+
+_ZIP32_LIMIT = 0xFFFFFFFF
+_UTF8_FLAG = 0x800
+_VERSION = 20
+_UNIX_FILE_ATTR = 0o600 << 16
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_RECORD = struct.Struct("<IHHHHIIH")
+
+
+def compress_type_for(arcname: str) -> int:
+    return ZIP_STORED if arcname.lower().endswith(STORED_EXTENSIONS) else ZIP_DEFLATED
+
+
+def _acquire_deflater():
+    try:
+        return _DEFLATER_POOL.get_nowait()
+    except queue.Empty:
+        return zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15, 8, zlib.Z_DEFAULT_STRATEGY)
+
+
+def deflate_one(content: bytes) -> Tuple[int, int, bytes]:
+    """
+    Compress one entry into a raw DEFLATE stream and return (crc32, size, compressed).
+    Runs in a worker process so compression scales across cores.
+    Deflaters are pooled and reused: Z_FULL_FLUSH byte-aligns the output and
+    drops the history window, so the next entry cannot back-reference this
+    one, and appending an empty final block terminates this entry's stream.
+    """
+    deflater = _acquire_deflater()
+    compressed = deflater.compress(content) + deflater.flush(zlib.Z_FULL_FLUSH) + _FINAL_EMPTY_BLOCK
+    # Only returned to the pool after a clean flush
+    _DEFLATER_POOL.put(deflater)
+    return zlib.crc32(content), len(content), compressed
+
+
+async def _crc32(fileobj: BinaryIO) -> int:
+    crc = 0
+    while chunk := await read_spool(fileobj, CHUNK_SIZE):
+        crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    t = time.localtime(timestamp)
+    dos_date = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dos_time = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return dos_time, dos_date
+
+
+async def stream_zip(entries: Iterable[Tuple[str, BinaryIO]], executor: Executor) -> AsyncIterator[bytes]:
+    """
+    Yield a ZIP archive entry by entry from (arcname, file object) pairs.
+    Compressible entries are deflated in `executor` a few entries ahead of the
+    one being streamed; stored entries are copied through in chunks after a
+    CRC pass, so they are never loaded whole. Since CRC and sizes are known
+    up front, each local header is written directly and no data descriptors
+    are needed. Takes ownership of the file objects and closes them.
+    Only ZIP32 is produced, which covers any upload this service accepts.
+    """
+    loop = asyncio.get_running_loop()
+    dos_time, dos_date = _dos_datetime(time.time())
+
+    pending = deque()
+    entry_iter = iter(entries)
+
+    async def submit_next() -> bool:
+        entry = next(entry_iter, None)
+        if entry is None:
+            return False
+        arcname, fileobj = entry
+        method = compress_type_for(arcname)
+        job = None
+        try:
+            if method == ZIP_DEFLATED:
+                fileobj.seek(0)
+                job = loop.run_in_executor(executor, deflate_one, await read_spool(fileobj))
+        except BaseException:
+            fileobj.close()
+            raise
+        pending.append((arcname, fileobj, method, job))
+        return True
+
+    # Entry popped from `pending` but not yet closed, so `finally` can reach it
+    current = None
+
+    try:
+        while len(pending) < DEFLATE_LOOKAHEAD and await submit_next():
+            pass
+
+        central_directory = []
+        offset = 0
+        while pending:
+            arcname, fileobj, method, job = pending.popleft()
+            current = fileobj
+            await submit_next()
+
+            if job is not None:
+                crc, size, data = await job
+                compress_size = len(data)
+            else:
+                fileobj.seek(0)
+                crc = await _crc32(fileobj)
+                size = compress_size = fileobj.tell()
+                data = None
+
+            if offset > _ZIP32_LIMIT or size > _ZIP32_LIMIT or compress_size > _ZIP32_LIMIT:
+                raise ValueError("Archive exceeds ZIP32 size limits")
+
+            try:
+                name = arcname.encode("ascii")
+                flags = 0
+            except UnicodeEncodeError:
+                name = arcname.encode("utf-8")
+                flags = _UTF8_FLAG
+
+            header = _LOCAL_HEADER.pack(
+                0x04034B50, _VERSION, flags, method, dos_time, dos_date,
+                crc, compress_size, size, len(name), 0
+            )
+            central_directory.append(_CENTRAL_HEADER.pack(
+                0x02014B50, 3 << 8 | _VERSION, _VERSION, flags, method, dos_time, dos_date,
+                crc, compress_size, size, len(name), 0, 0, 0, 0, _UNIX_FILE_ATTR, offset
+            ) + name)
+
+            yield header + name
+            if data is not None:
+                yield data
+            else:
+                fileobj.seek(0)
+                while chunk := await read_spool(fileobj, CHUNK_SIZE):
+                    yield chunk
+            fileobj.close()
+            current = None
+            offset += len(header) + len(name) + compress_size
+
+        directory = b"".join(central_directory)
+        count = len(central_directory)
+        if count > 0xFFFF or offset > _ZIP32_LIMIT:
+            raise ValueError("Archive exceeds ZIP32 size limits")
+        yield directory + _END_RECORD.pack(0x06054B50, 0, 0, count, count, len(directory), offset, 0)
+    finally:
+        # Client disconnects and errors must not leak spooled temp files
+        if current is not None:
+            current.close()
+        for _, fileobj, _, job in pending:
+            fileobj.close()
+            # Abandoned jobs: cancel, or mark a finished one's exception as retrieved
+            if job is not None and not job.cancel():
+                job.exception()
+        for _, fileobj in entry_iter:
+            fileobj.close()
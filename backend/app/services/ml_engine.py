@@ -1,13 +1,15 @@
+import io
 import os
+import hashlib
 import logging
 import warnings
 import asyncio
 import time
 import numpy as np
-import umap
-from sklearn.cluster import HDBSCAN
 from openai import AsyncOpenAI
+from app.core.http import http_client
 from typing import List, Dict
+from app.core.cache import redis_client
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -15,24 +17,66 @@ logger = logging.getLogger(__name__)
 # Suppress UMAP UserWarnings
 warnings.filterwarnings("ignore", category=UserWarning, module="umap")
 
+# Prefer RAPIDS cuML (GPU UMAP/HDBSCAN with the same estimator API) when available
+try:
+    import cupy
+    from cuml import UMAP, HDBSCAN
+    _GPU = True
+    _UMAP_BACKEND_KWARGS = {"build_algo": "nn_descent"}
+except ImportError:
+    from umap import UMAP
+    from sklearn.cluster import HDBSCAN
+    _GPU = False
+    _UMAP_BACKEND_KWARGS = {"low_memory": True}
+
+EMBEDDING_MODEL = "qwen/qwen3-embedding-8b"
+EMBEDDING_CACHE_TTL_SEC = 7 * 24 * 3600
+CLUSTER_CACHE_TTL_SEC = 24 * 3600
+
+# Folder name used when labelling fails; results containing it are never cached
+FALLBACK_LABEL = "Unclassified"
+
 # Initialize client for OpenRouter
 client = AsyncOpenAI(
     base_url="https://openrouter.ai/api/v1",
     api_key=os.getenv("OPENROUTER_API_KEY", "dummy-key"),
+    http_client=http_client,
 )
 
+def _embedding_cache_key(text: str) -> str:
+    return f"emb:{EMBEDDING_MODEL}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
 async def get_embeddings(texts: List[str]) -> np.ndarray:
-    """Fetch embeddings from OpenRouter using Qwen model in parallel batches."""
+    """
+    Fetch embeddings from OpenRouter using Qwen model in parallel batches.
+    Embeddings are cached in Redis (float16) keyed by SHA-256 of the text,
+    so only unseen texts hit the API.
+    """
     if not texts:
-        return np.array([])
+        return np.array([], dtype=np.float32)
     
     batch_size = 25 # Smaller batches for more concurrency
     
+    keys = [_embedding_cache_key(t) for t in texts]
+    try:
+        cached = await redis_client.mget(keys)
+    except Exception as e:
+        logger.error(f"Embedding cache read error: {e}")
+        cached = [None] * len(texts)
+
+    embeddings = [None] * len(texts)
+    missing = {}  # text -> indices still needing an embedding (dedupes identical texts)
+    for i, blob in enumerate(cached):
+        if blob is not None:
+            embeddings[i] = np.frombuffer(blob, dtype=np.float16)
+        else:
+            missing.setdefault(texts[i], []).append(i)
+    
     async def fetch_batch(batch: List[str], batch_idx: int):
         try:
             response = await client.embeddings.create(
                 input=batch,
-                model="qwen/qwen3-embedding-8b",
+                model=EMBEDDING_MODEL,
                 extra_body={
                     "provider": {
                         "order": ["nebius"],
@@ -42,17 +86,49 @@ async def get_embeddings(texts: List[str]) -> np.ndarray:
             return [data.embedding for data in response.data]
         except Exception as e:
             logger.error(f"Embedding error in batch {batch_idx}: {e}")
-            return [np.random.rand(1536).tolist() for _ in range(len(batch))]
+            return None
 
+    missing_texts = list(missing)
     tasks = []
-    for i in range(0, len(texts), batch_size):
-        tasks.append(fetch_batch(texts[i:i + batch_size], i // batch_size))
+    for i in range(0, len(missing_texts), batch_size):
+        tasks.append(fetch_batch(missing_texts[i:i + batch_size], i // batch_size))
     
     results = await asyncio.gather(*tasks)
     
-    # Flatten the results
-    all_embeddings = [emb for batch_result in results for emb in batch_result]
-    return np.array(all_embeddings)
+    # Scatter fresh embeddings back into place; only successful batches are cached
+    to_cache = {}
+    failed_texts = []
+    for batch_idx, batch_result in enumerate(results):
+        batch_texts = missing_texts[batch_idx * batch_size:(batch_idx + 1) * batch_size]
+        if batch_result is None:
+            failed_texts.extend(batch_texts)
+            continue
+        for j, text in enumerate(batch_texts):
+            emb = np.asarray(batch_result[j], dtype=np.float16)
+            to_cache[keys[missing[text][0]]] = emb.tobytes()
+            for i in missing[text]:
+                embeddings[i] = emb
+
+    if failed_texts:
+        # Random placeholders must match the width of real (cached or fresh) rows
+        known = next((emb for emb in embeddings if emb is not None), None)
+        dim = len(known) if known is not None else 1536
+        for text in failed_texts:
+            emb = np.random.rand(dim)
+            for i in missing[text]:
+                embeddings[i] = emb
+
+    if to_cache:
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key, blob in to_cache.items():
+                    pipe.set(key, blob, ex=EMBEDDING_CACHE_TTL_SEC)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Embedding cache write error: {e}")
+
+    # float32 halves UMAP's k-NN working set versus NumPy's float64 default
+    return np.asarray(embeddings, dtype=np.float32)
 
 async def get_cluster_label(texts: List[str]) -> str:
     """Generate a concise folder name using Google Gemini via OpenRouter."""
@@ -73,10 +149,10 @@ async def get_cluster_label(texts: List[str]) -> str:
         if content:
             # Clean up markdown and quotes
             return content.strip().replace('"', '').replace('*', '').replace('_', '').replace('#', '')
-        return "Unclassified"
+        return FALLBACK_LABEL
     except Exception as e:
         logger.error(f"Labeling error: {e}")
-        return "Unclassified"
+        return FALLBACK_LABEL
 
 async def generate_dataset_summary(organized_data: List[Dict]) -> str:
     """Generate a 1-3 sentence summary of the entire dataset."""
@@ -119,6 +195,18 @@ def _worker_run_clustering(embeddings: np.ndarray, n_samples: int) -> tuple[np.n
     Synchronous worker for CPU-intensive UMAP and HDBSCAN tasks.
     Runs in a separate thread.
     """
+    embeddings = embeddings.astype(np.float32, copy=False)
+
+    # L2-normalise once: on unit vectors euclidean distance ranks neighbours exactly
+    # like cosine, so both reducers can skip their own per-call normalisation
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    embeddings = embeddings / norms
+
+    if _GPU:
+        # Upload once; reductions and clustering then stay on the device
+        embeddings = cupy.asarray(embeddings)
+
     # 2. Dimensionality Reduction (UMAP)
     # Adjust parameters for small datasets to prevent spectral initialization errors
     init_mode = "random" if n_samples < 15 else "spectral"
@@ -133,24 +221,26 @@ def _worker_run_clustering(embeddings: np.ndarray, n_samples: int) -> tuple[np.n
          embeddings_for_viz = embeddings[:, :2] if embeddings.shape[1] >= 2 else embeddings
     else:
          # 2a. Clustering Reduction (e.g. 10D)
-         reducer_cluster = umap.UMAP(
+         reducer_cluster = UMAP(
             n_neighbors=n_neighbors,
             n_components=n_components_cluster,
             min_dist=0.0, 
-            metric='cosine',
+            metric='euclidean',
             random_state=42,
-            init=init_mode
+            init=init_mode,
+            **_UMAP_BACKEND_KWARGS
         )
          embeddings_for_clustering = reducer_cluster.fit_transform(embeddings)
          
          # 2b. Visualization Reduction (2D)
-         reducer_viz = umap.UMAP(
+         reducer_viz = UMAP(
             n_neighbors=n_neighbors,
             n_components=2,
             min_dist=0.0, 
-            metric='cosine',
+            metric='euclidean',
             random_state=42,
-            init=init_mode
+            init=init_mode,
+            **_UMAP_BACKEND_KWARGS
         )
          embeddings_for_viz = reducer_viz.fit_transform(embeddings)
 
@@ -162,9 +252,44 @@ def _worker_run_clustering(embeddings: np.ndarray, n_samples: int) -> tuple[np.n
         )
     # Use the higher dimensional embeddings for better clustering
     cluster_labels = clusterer.fit_predict(embeddings_for_clustering)
-    
+
+    if _GPU:
+        return cupy.asnumpy(cluster_labels), cupy.asnumpy(embeddings_for_viz)
     return cluster_labels, embeddings_for_viz
 
+def _cluster_cache_key(embeddings: np.ndarray) -> str:
+    digest = hashlib.blake2b(embeddings.tobytes(), digest_size=16)
+    digest.update(str(embeddings.shape).encode())
+    return f"cluster:{digest.hexdigest()}"
+
+async def _load_cached_clustering(key: str):
+    """Return (cluster_labels, embeddings_for_viz, cluster_names) from Redis, or None on miss."""
+    try:
+        blob = await redis_client.get(key)
+    except Exception as e:
+        logger.error(f"Cluster cache read error: {e}")
+        return None
+    if blob is None:
+        return None
+
+    with np.load(io.BytesIO(blob)) as data:
+        cluster_names = dict(zip(data["cluster_ids"].tolist(), data["cluster_names"].tolist()))
+        return data["labels"], data["viz"], cluster_names
+
+async def _store_cached_clustering(key: str, cluster_labels: np.ndarray, embeddings_for_viz: np.ndarray, cluster_names: Dict):
+    buf = io.BytesIO()
+    np.savez_compressed(
+        buf,
+        labels=np.asarray(cluster_labels),
+        viz=np.asarray(embeddings_for_viz),
+        cluster_ids=np.array(list(cluster_names.keys()), dtype=np.int64),
+        cluster_names=np.array(list(cluster_names.values()), dtype=str)
+    )
+    try:
+        await redis_client.set(key, buf.getvalue(), ex=CLUSTER_CACHE_TTL_SEC)
+    except Exception as e:
+        logger.error(f"Cluster cache write error: {e}")
+
 async def clustering_pipeline(processed_data: List[Dict]) -> List[Dict]:
     """
     Core ML Pipeline:
@@ -176,7 +301,8 @@ async def clustering_pipeline(processed_data: List[Dict]) -> List[Dict]:
     if not processed_data:
         return []
 
-    texts = [d["text"] for d in processed_data if d["text"].strip()]
+    text_indices = [i for i, d in enumerate(processed_data) if d["text"].strip()]
+    texts = [processed_data[i]["text"] for i in text_indices]
     n_samples = len(texts)
 
     if n_samples < 2:
@@ -189,63 +315,75 @@ async def clustering_pipeline(processed_data: List[Dict]) -> List[Dict]:
     embeddings = await get_embeddings(texts)
     logger.info(f"Embeddings generated in {time.time() - t0:.2f}s")
     
-    # 2 & 3. Reduction & Clustering (CPU Bound - Offload to Thread)
-    t1 = time.time()
-    
-    cluster_labels, embeddings_for_viz = await asyncio.to_thread(
-        _worker_run_clustering, embeddings, n_samples
-    )
+    # Identical inputs give identical UMAP/HDBSCAN output (random_state=42), so reuse it
+    cache_key = _cluster_cache_key(embeddings)
+    cached = await _load_cached_clustering(cache_key)
+    if cached is not None:
+        cluster_labels, embeddings_for_viz, cluster_names = cached
+        logger.info("Clustering served from cache")
+    else:
+        # 2 & 3. Reduction & Clustering (CPU Bound - Offload to Thread)
+        t1 = time.time()
+        
+        cluster_labels, embeddings_for_viz = await asyncio.to_thread(
+            _worker_run_clustering, embeddings, n_samples
+        )
 
-    logger.info(f"UMAP & HDBSCAN took {time.time() - t1:.2f}s")
-    
-    # 4. Labeling Clusters (Parallelized)
-    t3 = time.time()
-    unique_clusters = set(cluster_labels)
-    cluster_names = {}
-    
-    label_tasks = []
-    cluster_ids_for_tasks = []
+        logger.info(f"UMAP & HDBSCAN took {time.time() - t1:.2f}s")
+        
+        # 4. Labeling Clusters (Parallelized)
+        t3 = time.time()
+        cluster_names = {}
+        
+        label_tasks = []
+        cluster_ids_for_tasks = []
 
-    for cluster_id in unique_clusters:
-        if cluster_id == -1:
-            cluster_names[cluster_id] = "Unsorted"
-        else:
-            # Get samples for this cluster to generate a label
-            indices = [i for i, l in enumerate(cluster_labels) if l == cluster_id]
-            sample_texts = [texts[i] for i in indices]
-            
-            # Create a task for labeling
-            label_tasks.append(get_cluster_label(sample_texts))
-            cluster_ids_for_tasks.append(cluster_id)
-    
-    # Run labeling tasks concurrently
-    if label_tasks:
-        labels = await asyncio.gather(*label_tasks)
-        for cid, label in zip(cluster_ids_for_tasks, labels):
-            cluster_names[cid] = label
-    logger.info(f"Cluster labeling took {time.time() - t3:.2f}s")
-
-    # Map texts back to folder names and coords
-    text_to_folder = {}
-    text_to_coords = {}
-    
-    for i, label in enumerate(cluster_labels):
-        text = texts[i]
-        text_to_folder[text] = cluster_names[label]
+        # Group document indices by cluster in one sort; stable keeps upload order within a group
+        order = np.argsort(cluster_labels, kind="stable")
+        unique_clusters, starts = np.unique(cluster_labels[order], return_index=True)
+        bounds = np.append(starts, len(order))
+
+        for k, cluster_id in enumerate(unique_clusters):
+            if cluster_id == -1:
+                cluster_names[cluster_id] = "Unsorted"
+            else:
+                # Get samples for this cluster to generate a label
+                indices = order[bounds[k]:bounds[k + 1]]
+                sample_texts = [texts[i] for i in indices]
+                
+                # Create a task for labeling
+                label_tasks.append(get_cluster_label(sample_texts))
+                cluster_ids_for_tasks.append(cluster_id)
+        
+        # Run labeling tasks concurrently
+        if label_tasks:
+            labels = await asyncio.gather(*label_tasks)
+            for cid, label in zip(cluster_ids_for_tasks, labels):
+                cluster_names[cid] = label
+        logger.info(f"Cluster labeling took {time.time() - t3:.2f}s")
+
+        # A transient labelling failure must not stick to this document set
+        if FALLBACK_LABEL not in cluster_names.values():
+            await _store_cached_clustering(cache_key, cluster_labels, embeddings_for_viz, cluster_names)
+
+    # Map results back by position (texts and text_indices are aligned), so
+    # documents with identical text no longer collapse onto one dict entry
+    coords = np.asarray(embeddings_for_viz)
+    for d in processed_data:
+        d["folder"] = "Misc"
+        d["x"] = 0.0
+        d["y"] = 0.0
+
+    for pos, orig_i in enumerate(text_indices):
+        d = processed_data[orig_i]
+        d["folder"] = cluster_names[cluster_labels[pos]]
         # Use the 2D visualization embeddings for coordinates
         if n_samples > 3:
-            # Force conversion to numpy array to satisfy type checker if needed, 
-            # though it should already be one. 
-            coords_row = np.asarray(embeddings_for_viz)[i]
-            text_to_coords[text] = {"x": float(coords_row[0]), "y": float(coords_row[1])}
+            d["x"] = coords[pos, 0].item()
+            d["y"] = coords[pos, 1].item()
         else:
             # Dummy coords for tiny datasets to prevent UI crash
-            text_to_coords[text] = {"x": float(i), "y": float(i)}
-
-    for d in processed_data:
-        d["folder"] = text_to_folder.get(d["text"], "Misc")
-        coords = text_to_coords.get(d["text"], {"x": 0.0, "y": 0.0})
-        d["x"] = coords["x"]
-        d["y"] = coords["y"]
+            d["x"] = float(pos)
+            d["y"] = float(pos)
         
     return processed_data
\ No newline at end of file
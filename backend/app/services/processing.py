@@ -1,56 +1,208 @@
 import io
 import os
-import base64
+import codecs
+import hashlib
+import json
 import asyncio
 import logging
 import time
-from typing import List, Dict, Tuple, Optional
+import threading
+import zipfile
+from collections import Counter, OrderedDict
+from tempfile import SpooledTemporaryFile
+from typing import List, Dict, Tuple, Optional, Callable, Awaitable
 from fastapi import UploadFile
-import PyPDF2
-from docx import Document
+try:
+    # SIMD-accelerated drop-in for the stdlib module
+    import pybase64 as base64
+except ImportError:
+    import base64
+try:
+    # Native PDFium text extraction
+    import pypdfium2 as pdfium
+except ImportError:
+    # Pure-Python fallback for platforms without PDFium wheels
+    pdfium = None
+    import PyPDF2
+from lxml import etree
 from app.services.privacy import scrub_pii
-from langdetect import detect, LangDetectException
+from app.services.spool import CHUNK_SIZE, spool_upload, read_spool
+from app.core.workers import process_pool, POOL_WORKERS
+try:
+    # CLD3: compact C++ neural language identifier, far faster than langdetect
+    import gcld3
+except ImportError:
+    gcld3 = None
+    from langdetect import DetectorFactory, LangDetectException
+    from langdetect.detector_factory import PROFILES_DIRECTORY
 from openai import AsyncOpenAI
+from app.core.http import http_client
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-# Suppress PyPDF2 warnings
-logging.getLogger("PyPDF2").setLevel(logging.ERROR)
+# 4 bytes per character is the UTF-8 worst case for the 2000-character text head
+TEXT_HEAD_BYTES = 8000
+
+# Extraction results for identical content are reused across uploads; the cache
+# is a bounded in-process LRU, so scrubbed text is never persisted
+EXTRACTION_CACHE_SIZE = 256
+_ANALYSIS_CACHE: "OrderedDict[str, Dict]" = OrderedDict()
+
+# CLD3 gains nothing from more input than this
+LID_MAX_BYTES = 1000
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_APP_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}"
+
+# Run children rendered as whitespace, the way python-docx renders them
+_RUN_BREAKS = {f"{_WORD_NS}tab": "\t", f"{_WORD_NS}br": "\n", f"{_WORD_NS}cr": "\n"}
+
+# Uploaded XML is untrusted: never load DTDs, expand entities or touch the network
+_SAFE_XML_OPTIONS = {"resolve_entities": False, "no_network": True, "load_dtd": False}
+
+def _reject_dtd(tree) -> None:
+    # OOXML parts never carry a DOCTYPE; one is only there to smuggle in entities
+    if tree.docinfo.doctype:
+        raise ValueError("DTD in OOXML part")
+
+_IMAGE_EXTS = frozenset({"png", "jpg", "jpeg", "webp"})
+
+# Images described per OCR request, capped by count and by inline base64 payload
+IMAGE_BATCH_SIZE = 8
+IMAGE_BATCH_MAX_BYTES = 8 * 1024 * 1024
+
+# Bound in-flight work: documents queue for the process pool (and only then
+# read their spool into memory), images for the OCR API's rate limit
+_DOC_SEM = asyncio.Semaphore(settings.DOC_CONCURRENCY or POOL_WORKERS * 2)
+_API_SEM = asyncio.Semaphore(settings.API_CONCURRENCY)
+
+# PDFium is not thread-safe; serialize access across worker threads
+_PDFIUM_LOCK = threading.Lock()
+
+if pdfium is None:
+    # Suppress PyPDF2 warnings
+    logging.getLogger("PyPDF2").setLevel(logging.ERROR)
+
+if gcld3 is not None:
+    # NNetLanguageIdentifier keeps per-call scratch state; use one per thread
+    _lid_local = threading.local()
+
+    def _detect_language(text: str) -> str:
+        identifier = getattr(_lid_local, "identifier", None)
+        if identifier is None:
+            identifier = _lid_local.identifier = gcld3.NNetLanguageIdentifier(
+                min_num_bytes=0, max_num_bytes=LID_MAX_BYTES
+            )
+        result = identifier.FindLanguage(text=text[:LID_MAX_BYTES])
+        # Strip script suffixes such as "zh-Latn"; the language column holds short codes
+        return result.language.split("-")[0] if result.is_reliable else "unk"
+
+else:
+    LANGDETECT_LANGUAGES = [lang.strip() for lang in settings.LANGDETECT_LANGUAGES.split(",") if lang.strip()]
+
+    def _build_language_factory(languages: List[str]) -> DetectorFactory:
+        """Load only the given profiles; each one is a large resident n-gram table."""
+        profiles = []
+        for lang in languages:
+            with open(os.path.join(PROFILES_DIRECTORY, lang), encoding="utf-8") as f:
+                profiles.append(f.read())
+        factory = DetectorFactory()
+        factory.load_json_profile(profiles)
+        return factory
+
+    # Load language profiles once at import, so forked worker processes inherit them
+    # instead of each loading its own copy on first use; a fixed seed makes
+    # langdetect's randomized sampling deterministic
+    _LANG_FACTORY = _build_language_factory(LANGDETECT_LANGUAGES)
+    _LANG_FACTORY.seed = 0
+
+    def _detect_language(text: str) -> str:
+        detector = _LANG_FACTORY.create()
+        detector.append(text)
+        try:
+            return detector.detect()
+        except LangDetectException:
+            return "unk"
 
 # Initialize async client for OCR/Vision
 client = AsyncOpenAI(
     base_url="https://openrouter.ai/api/v1",
     api_key=os.getenv("OPENROUTER_API_KEY", "dummy-key"),
+    http_client=http_client,
 )
 
-def extract_text_from_pdf_sync(content: bytes) -> Tuple[str, int]:
-    """Strictly synchronous CPU work for PDF extraction."""
-    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-    text = ""
+def _extract_text_from_pdf_pypdf2(content: bytes) -> Tuple[str, int]:
+    # Non-strict parsing tolerates minor xref damage instead of raising. PyPDF2
+    # flattens the whole page tree on first access, but only the first 3 pages'
+    # content streams are ever parsed
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content), strict=False)
     total_pages = len(pdf_reader.pages)
-    num_pages = min(total_pages, 3)
-    for i in range(num_pages):
-        text += pdf_reader.pages[i].extract_text() or ""
-    return text, total_pages
+    parts = [pdf_reader.pages[i].extract_text() or "" for i in range(min(total_pages, 3))]
+    return "".join(parts), total_pages
+
+def extract_text_from_pdf_sync(content: bytes) -> Tuple[str, int]:
+    """Strictly synchronous CPU work for PDF extraction (native PDFium, PyPDF2 fallback)."""
+    if pdfium is None:
+        return _extract_text_from_pdf_pypdf2(content)
+
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(content)
+        try:
+            total_pages = len(pdf)
+            parts = []
+            for i in range(min(total_pages, 3)):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                parts.append(textpage.get_text_bounded())
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+    return "".join(parts), total_pages
+
+def _run_text(run) -> str:
+    # Only direct children of w:r count; w:tab also defines tab stops in w:pPr
+    parts = []
+    for child in run:
+        if child.tag == f"{_WORD_NS}t":
+            parts.append(child.text or "")
+        elif child.tag in _RUN_BREAKS:
+            parts.append(_RUN_BREAKS[child.tag])
+    return "".join(parts)
 
 def extract_text_from_docx_sync(content: bytes) -> Tuple[str, Optional[int]]:
-    """Strictly synchronous CPU work for DOCX extraction."""
-    doc = Document(io.BytesIO(content))
-    text = ""
-    paragraphs = doc.paragraphs[:50] 
-    for para in paragraphs:
-        text += para.text + "\n"
-    
-    try:
-        pages = doc.part.package.app_properties.pages
-    except:
-        pages = None
+    """
+    Strictly synchronous CPU work for DOCX extraction.
+    Streams word/document.xml and stops after 50 paragraphs instead of parsing the full DOM.
+    """
+    with zipfile.ZipFile(io.BytesIO(content)) as docx:
+        paragraphs = []
+        with docx.open("word/document.xml") as xml:
+            for _, elem in etree.iterparse(xml, tag=f"{_WORD_NS}p", **_SAFE_XML_OPTIONS):
+                if not paragraphs:
+                    _reject_dtd(elem.getroottree())
+                paragraphs.append("".join(_run_text(run) for run in elem.iter(f"{_WORD_NS}r")))
+                elem.clear()
+                if len(paragraphs) >= 50:
+                    break
+        text = "".join(p + "\n" for p in paragraphs)
+
+        try:
+            with docx.open("docProps/app.xml") as xml:
+                app_props = etree.parse(xml, etree.XMLParser(**_SAFE_XML_OPTIONS))
+                _reject_dtd(app_props)
+                pages = int(app_props.findtext(f"{_APP_NS}Pages"))
+        except Exception as e:
+            logger.debug("DOCX page count unavailable: %s", e)
+            pages = None
         
     return text, pages
 
 async def extract_description_from_image(content: bytes, mime_type: str) -> str:
     """Use Gemini Flash to describe the image content. Remains Async (I/O bound)."""
-    base64_image = base64.b64encode(content).decode('utf-8')
+    # Base64 output is pure ASCII; build the data URL once
+    image_url = f"data:{mime_type};base64,{base64.b64encode(content).decode('ascii')}"
     
     try:
         response = await client.chat.completions.create(
@@ -63,7 +215,7 @@ async def extract_description_from_image(content: bytes, mime_type: str) -> str:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:{mime_type};base64,{base64_image}"
+                                "url": image_url
                             }
                         }
                     ]
@@ -73,28 +225,72 @@ async def extract_description_from_image(content: bytes, mime_type: str) -> str:
         )
         return response.choices[0].message.content or ""
     except Exception as e:
-        print(f"OCR Error: {e}")
+        logger.error(f"OCR Error: {e}")
         return ""
 
-def _worker_analyze_text(text: str, filename: str, content: bytes, file_data: dict, page_count: Optional[int]) -> Dict:
+async def extract_descriptions_from_images(items: List[Tuple[bytes, str]]) -> Optional[List[str]]:
+    """
+    Describe several images in one request, one description per (content, mime_type)
+    item in order. Returns None if the request fails or the reply does not parse,
+    so the caller can fall back to one request per image.
+    """
+    parts = [{
+        "type": "text",
+        "text": (
+            f"Describe the content of each of the {len(items)} images below in detail for indexing purposes. "
+            "Include any visible text. Respond with a JSON object "
+            '{"descriptions": [...]} holding one string per image, in the order given.'
+        )
+    }]
+    for i, (content, mime_type) in enumerate(items, 1):
+        parts.append({"type": "text", "text": f"Image {i}:"})
+        parts.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{mime_type};base64,{base64.b64encode(content).decode('ascii')}"
+            }
+        })
+
+    try:
+        response = await client.chat.completions.create(
+            model="google/gemini-3-flash-preview",
+            messages=[{"role": "user", "content": parts}],
+            response_format={"type": "json_object"},
+            max_tokens=500 * len(items)
+        )
+    except Exception as e:
+        logger.warning(f"Batched OCR request for {len(items)} images failed: {e}")
+        return None
+
+    try:
+        descriptions = json.loads(response.choices[0].message.content or "")["descriptions"]
+        if len(descriptions) == len(items) and all(isinstance(d, str) for d in descriptions):
+            return descriptions
+    except (ValueError, KeyError, TypeError):
+        pass
+    logger.warning(f"Unparseable batched OCR reply for {len(items)} images")
+    return None
+
+def _image_mime_type(file_type: str) -> str:
+    return f"image/{file_type if file_type != 'jpg' else 'jpeg'}"
+
+def _worker_analyze_text(text: str, filename: str, file_data: dict, page_count: Optional[int]) -> Dict:
     """
     Shared logic for Scrubbing and Language Detection.
-    Runs in a separate thread.
+    Runs in a worker thread or process; the raw content is attached by the caller
+    so it is never shipped back across the process boundary.
     """
     # Scrubbing (CPU Heavy Regex)
     scrubbed_text = scrub_pii(text)
     
     # Language Detection (CPU Heavy Math)
     language = "unk"
-    if len(scrubbed_text.strip()) > 50:
-        try:
-            language = detect(scrubbed_text)
-        except LangDetectException:
-            language = "unk"
+    # The length check alone rules out short snippets without copying them via strip()
+    if len(scrubbed_text) > 50 and len(scrubbed_text.strip()) > 50:
+        language = _detect_language(scrubbed_text)
             
     return {
         "filename": filename,
-        "content": content,
         "text": scrubbed_text,
         "metadata": {
             "file_size_kb": file_data['file_size_kb'],
@@ -104,101 +300,248 @@ def _worker_analyze_text(text: str, filename: str, content: bytes, file_data: di
         }
     }
 
-def _worker_process_document_cpu(file_data: dict) -> Dict:
+def _worker_process_document_cpu(file_data: dict, content: bytes) -> Dict:
     """
     Handles PDF/DOCX/Text extraction + Scrubbing + Detection.
-    Runs entirely in a separate thread.
+    Runs entirely in a worker process, so it must stay top-level and picklable.
+    For plain text `content` is only the head of the file.
     """
-    content = file_data['content']
     filename = file_data['filename']
+    file_type = file_data['file_type']
     
     text = ""
     page_count = None
 
     # 1. Extraction (CPU Heavy)
-    if filename.lower().endswith(".pdf"):
+    if file_type == "pdf":
         try:
             text, page_count = extract_text_from_pdf_sync(content)
-        except:
+        except Exception as e:
+            logger.debug("PDF extraction failed for %s: %s", filename, e)
             text = ""
-    elif filename.lower().endswith(".docx"):
+    elif file_type == "docx":
         try:
             text, page_count = extract_text_from_docx_sync(content)
-        except:
+        except Exception as e:
+            logger.debug("DOCX extraction failed for %s: %s", filename, e)
             text = ""
     else:
-        # Plain text decoding
+        # Plain text decoding (incremental, so a character cut at the head boundary is not an error)
         try:
-            text = content.decode("utf-8")[:2000]
-        except:
+            text = codecs.getincrementaldecoder("utf-8")().decode(content)[:2000]
+        except Exception as e:
+            logger.debug("Text decoding failed for %s: %s", filename, e)
             text = ""
 
     # 2. Analysis (CPU Heavy)
-    return _worker_analyze_text(text, filename, content, file_data, page_count)
+    return _worker_analyze_text(text, filename, file_data, page_count)
 
-async def process_single_file(file_data: dict) -> Dict:
-    filename = file_data['filename']
-    content = file_data['content']
+def _extraction_cache_key(file_type: str, content: bytes) -> str:
+    # hashlib releases the GIL on large buffers, so this runs in a worker thread
+    return f"{file_type}:{hashlib.blake2b(content, digest_size=16).hexdigest()}"
+
+def _spool_cache_key(file_type: str, spool: SpooledTemporaryFile) -> Tuple[str, int]:
+    """Same key as _extraction_cache_key, hashed in chunks; also returns the byte size."""
+    digest = hashlib.blake2b(digest_size=16)
+    spool.seek(0)
+    size = 0
+    while chunk := spool.read(CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    spool.seek(0)
+    return f"{file_type}:{digest.hexdigest()}", size
+
+def _load_cached_analysis(key: str, file_data: dict) -> Optional[Dict]:
+    """
+    Return the analysis an earlier upload of identical bytes left in the cache, or
+    None on miss. Only the content-derived fields are cached; the per-upload
+    filename and size are filled in from `file_data`.
+    """
+    cached = _ANALYSIS_CACHE.get(key)
+    if cached is None:
+        return None
+    _ANALYSIS_CACHE.move_to_end(key)
+    return {
+        "filename": file_data['filename'],
+        "text": cached["text"],
+        "metadata": {
+            "file_size_kb": file_data['file_size_kb'],
+            "file_type": file_data['file_type'],
+            "page_count": cached["page_count"],
+            "language": cached["language"]
+        }
+    }
+
+def _store_cached_analysis(key: str, result: Dict):
+    # Empty text is what failed extraction or OCR looks like; never cache it
+    if not result["text"]:
+        return
+    meta = result["metadata"]
+    _ANALYSIS_CACHE[key] = {"text": result["text"], "page_count": meta["page_count"], "language": meta["language"]}
+    _ANALYSIS_CACHE.move_to_end(key)
+    if len(_ANALYSIS_CACHE) > EXTRACTION_CACHE_SIZE:
+        _ANALYSIS_CACHE.popitem(last=False)
+
+async def _cached_analysis(file_data: dict, content: bytes, analyze: Callable[[], Awaitable[Dict]]) -> Dict:
+    """Return the analysis for `content`, reusing the cached one for identical bytes."""
+    key = await asyncio.to_thread(_extraction_cache_key, file_data['file_type'], content)
+    result = _load_cached_analysis(key, file_data)
+    if result is None:
+        result = await analyze()
+        _store_cached_analysis(key, result)
+    return result
+
+async def process_single_file(file_data: dict, spool: SpooledTemporaryFile) -> Dict:
+    """Documents: offload the ENTIRE chain (Extract -> Scrub -> Detect) to a worker process."""
     file_type = file_data['file_type']
 
-    # --- PATH A: Images (Async I/O + Threaded Analysis) ---
-    if filename.lower().endswith((".png", ".jpg", ".jpeg", ".webp")):
-        try:
-            mime_type = f"image/{file_type if file_type != 'jpg' else 'jpeg'}"
-            
-            # 1. AWAIT the API call (Keep this on the main loop!)
-            text = await extract_description_from_image(content, mime_type)
-        except:
-            text = ""
-            
-        # 2. Offload the scrubbing/detection of the image description to a thread
-        return await asyncio.to_thread(
-            _worker_analyze_text, 
-            text, filename, content, file_data, None
+    # Parsing runs on all cores instead of contending for the GIL.
+    # Plain text only needs enough bytes for the first 2000 characters.
+    async with _DOC_SEM:
+        if file_type in ("pdf", "docx"):
+            content = await read_spool(spool)
+        else:
+            content = await read_spool(spool, TEXT_HEAD_BYTES)
+        loop = asyncio.get_running_loop()
+        result = await _cached_analysis(
+            file_data, content,
+            lambda: loop.run_in_executor(process_pool, _worker_process_document_cpu, file_data, content)
         )
 
-    # --- PATH B: Documents (Pure CPU Offload) ---
-    else:
-        # Offload the ENTIRE chain (Extract -> Scrub -> Detect)
-        # The main event loop is instantly free to handle the next request.
-        return await asyncio.to_thread(_worker_process_document_cpu, file_data)
+    # The spool, not a bytes copy, is what is kept around for zipping
+    spool.seek(0)
+    result["content"] = spool
+    return result
+
+async def process_image_files(images: List[Tuple[dict, SpooledTemporaryFile]]) -> List[Dict]:
+    """
+    Images: cache lookups per file, then uncached images are described in
+    batches of up to IMAGE_BATCH_SIZE images / IMAGE_BATCH_MAX_BYTES of base64
+    per API call (Async I/O + Threaded Analysis).
+    """
+    # Hash the spools in chunks; image bytes are only read once their batch holds an API slot
+    keyed = await asyncio.gather(*(
+        asyncio.to_thread(_spool_cache_key, file_data['file_type'], spool)
+        for file_data, spool in images
+    ))
+    keys = [key for key, _ in keyed]
+    sizes = [size for _, size in keyed]
+    results = [_load_cached_analysis(key, file_data) for (file_data, _), key in zip(images, keys)]
+    missing = [i for i, result in enumerate(results) if result is None]
+
+    async def item(i: int) -> Tuple[bytes, str]:
+        file_data, spool = images[i]
+        spool.seek(0)
+        return await read_spool(spool), _image_mime_type(file_data['file_type'])
+
+    async def describe_one(i: int) -> str:
+        async with _API_SEM:
+            return await extract_description_from_image(*await item(i))
+
+    async def describe_batch(batch: List[int]):
+        # 1. AWAIT the API call (Keep this on the main loop!)
+        descriptions = None
+        if len(batch) > 1:
+            async with _API_SEM:
+                # The batch's bytes live only for the duration of this request
+                descriptions = await extract_descriptions_from_images([await item(i) for i in batch])
+        if descriptions is None:
+            # One request per image, each under its own API slot, so a single
+            # bad image costs only its own description
+            descriptions = await asyncio.gather(*(describe_one(i) for i in batch))
+
+        # 2. Offload the scrubbing/detection of each description to a thread
+        async def analyze(i: int, text: str):
+            file_data = images[i][0]
+            results[i] = await asyncio.to_thread(
+                _worker_analyze_text,
+                text, file_data['filename'], file_data, None
+            )
+            _store_cached_analysis(keys[i], results[i])
+
+        await asyncio.gather(*(analyze(i, text) for i, text in zip(batch, descriptions)))
+
+    batches = []
+    batch, batch_bytes = [], 0
+    for i in missing:
+        encoded_size = (sizes[i] + 2) // 3 * 4
+        if batch and (len(batch) >= IMAGE_BATCH_SIZE or batch_bytes + encoded_size > IMAGE_BATCH_MAX_BYTES):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(i)
+        batch_bytes += encoded_size
+    if batch:
+        batches.append(batch)
+
+    await asyncio.gather(*(describe_batch(batch) for batch in batches))
+
+    for (_, spool), result in zip(images, results):
+        spool.seek(0)
+        result["content"] = spool
+    return results
 
 async def process_files(files: List[UploadFile]) -> List[Dict]:
-    seen_filenames = {}
+    seen_filenames = Counter()
 
-    # Pre-read all files (IO bound, but fast for memory) and prepare unique names
-    files_to_process = []
+    # Prepare unique names up front (needs no content), so suffixes follow upload order
+    names = []
     
     for file in files:
-        content = await file.read()
-        original_filename = file.filename
-        base_name = original_filename.split("/")[-1].split("\\")[-1]
-        
-        if base_name in seen_filenames:
-            seen_filenames[base_name] += 1
-            name_part, ext = os.path.splitext(base_name)
-            filename = f"{name_part}-{seen_filenames[base_name]}{ext}"
-        else:
-            seen_filenames[base_name] = 0
-            filename = base_name
-        
-        file_size_kb = len(content) // 1024
-        file_type = filename.split('.')[-1].lower() if '.' in filename else "unknown"
+        # Client paths may use either separator
+        base_name = os.path.basename(file.filename.replace("\\", "/"))
+        name_part, ext = os.path.splitext(base_name)
+
+        idx = seen_filenames[base_name]
+        seen_filenames[base_name] += 1
+        filename = base_name if idx == 0 else f"{name_part}-{idx}{ext}"
+        file_type = ext[1:].lower() or "unknown"
+        names.append((filename, file_type))
+
+    async def _spool(file: UploadFile, filename: str, file_type: str) -> Tuple[dict, SpooledTemporaryFile]:
+        spool = await spool_upload(file)
+        file_size_kb = spool.seek(0, io.SEEK_END) // 1024
+        spool.seek(0)
         
-        files_to_process.append({
+        file_data = {
             "filename": filename,
-            "content": content,
             "file_size_kb": file_size_kb,
             "file_type": file_type
-        })
+        }
+        return file_data, spool
+
+    async def _document_pipeline(file: UploadFile, filename: str, file_type: str) -> Dict:
+        # Each document is dispatched as soon as its own upload is spooled, so
+        # extraction of early files overlaps with reading later ones
+        return await process_single_file(*await _spool(file, filename, file_type))
+
+    async def _image_pipeline(uploads: List[Tuple[UploadFile, str, str]]) -> List[Dict]:
+        # Images are described in batches, so they are collected before the API calls
+        return await process_image_files(await asyncio.gather(*(_spool(*upload) for upload in uploads)))
+
+    image_indices = []
+    image_uploads = []
+    document_indices = []
+    document_tasks = []
+    for i, (file, (filename, file_type)) in enumerate(zip(files, names)):
+        if file_type in _IMAGE_EXTS:
+            image_indices.append(i)
+            image_uploads.append((file, filename, file_type))
+        else:
+            document_indices.append(i)
+            document_tasks.append(_document_pipeline(file, filename, file_type))
 
-    # Create tasks for parallel processing
-    logger.info(f"Processing {len(files_to_process)} files concurrently...")
+    logger.info(f"Processing {len(files)} files concurrently...")
     t0 = time.time()
     
-    # Run all tasks concurrently
-    processed_files = await asyncio.gather(*[process_single_file(f) for f in files_to_process])
+    # Run the document pipelines and the image batches concurrently
+    image_results, *document_results = await asyncio.gather(_image_pipeline(image_uploads), *document_tasks)
     
     logger.info(f"Parallel processing finished in {time.time() - t0:.2f}s")
     
-    return processed_files
\ No newline at end of file
+    # Restore upload order
+    processed_files = [None] * len(files)
+    for i, result in zip(image_indices, image_results):
+        processed_files[i] = result
+    for i, result in zip(document_indices, document_results):
+        processed_files[i] = result
+    return processed_files
@@ -0,0 +1,35 @@
+import asyncio
+import shutil
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO
+from fastapi import UploadFile
+
+# Uploads larger than this roll over from RAM to a temporary file on disk
+SPOOL_MAX_SIZE = 512 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+async def spool_upload(file: UploadFile) -> SpooledTemporaryFile:
+    """
+    Copy an upload into our own spool in chunks, so it outlives the request
+    body (Starlette closes UploadFiles before a streamed response is sent)
+    without ever holding the whole payload as one bytes object.
+    """
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    source_in_memory = not getattr(file.file, "_rolled", True)
+    if source_in_memory and file.size is not None and file.size <= SPOOL_MAX_SIZE:
+        # Memory to memory: no syscalls, cheaper than a thread hop
+        shutil.copyfileobj(file.file, spool, CHUNK_SIZE)
+    else:
+        # Disk reads and writes on either side block, so the whole copy runs in one
+        # worker thread instead of hopping threads for every chunk
+        await asyncio.to_thread(shutil.copyfileobj, file.file, spool, CHUNK_SIZE)
+    spool.seek(0)
+    return spool
+
+
+async def read_spool(spool: BinaryIO, size: int = -1) -> bytes:
+    """Read from a spool, off the event loop when it is disk-backed."""
+    if getattr(spool, "_rolled", True):
+        return await asyncio.to_thread(spool.read, size)
+    return spool.read(size)
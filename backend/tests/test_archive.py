@@ -0,0 +1,89 @@
+import asyncio
+import io
+import queue
+import zipfile
+import zlib as std_zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services import archive
+
+
+ENTRIES = [
+    ("Invoices/report.txt", b"quarterly figures " * 5000),
+    ("Invoices/scan.pdf", b"%PDF-1.4 already compressed payload"),
+    ("Notities/überzicht – 2024.txt", "ünïcödé content ".encode("utf-8") * 300),
+    ("Empty/blank.txt", b""),
+    ("Empty/blank.png", b""),
+    ("Misc/random.bin", bytes(range(256)) * 64),
+]
+
+
+@pytest.fixture(params=["isal", "zlib"])
+def backend(request, monkeypatch):
+    if request.param == "isal":
+        isal_zlib = pytest.importorskip("isal.isal_zlib")
+        monkeypatch.setattr(archive, "zlib", isal_zlib)
+        monkeypatch.setattr(archive, "DEFLATE_LEVEL", 1)
+    else:
+        monkeypatch.setattr(archive, "zlib", std_zlib)
+        monkeypatch.setattr(archive, "DEFLATE_LEVEL", 6)
+    # Pooled deflaters belong to one backend
+    monkeypatch.setattr(archive, "_DEFLATER_POOL", queue.LifoQueue())
+    return request.param
+
+
+def _build(entries):
+    files = [(name, io.BytesIO(content)) for name, content in entries]
+
+    async def collect():
+        # Threads, not processes, so the monkeypatched backend is used
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return b"".join([chunk async for chunk in archive.stream_zip(files, executor)])
+
+    return asyncio.run(collect()), files
+
+
+def test_round_trip(backend):
+    # Repeat the entries so pooled deflaters are reused across entries
+    entries = ENTRIES + [(f"Copy/{i}-{name.split('/')[-1]}", content) for i, (name, content) in enumerate(ENTRIES)]
+    data, files = _build(entries)
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == [name for name, _ in entries]
+        for name, content in entries:
+            info = zf.getinfo(name)
+            expected = archive.compress_type_for(name)
+            assert info.compress_type == expected
+            assert zf.read(name) == content
+    assert all(fileobj.closed for _, fileobj in files)
+
+
+def test_deflated_entries_shrink(backend):
+    data, _ = _build([("a.txt", b"abc" * 10000)])
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.getinfo("a.txt").compress_size < 1000
+
+
+def test_empty_archive():
+    data, _ = _build([])
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == []
+
+
+def test_failed_entry_closes_every_file(monkeypatch):
+    def broken(content):
+        raise RuntimeError("deflate failed")
+
+    monkeypatch.setattr(archive, "deflate_one", broken)
+    files = [(f"{i}.txt", io.BytesIO(b"x" * 100)) for i in range(archive.DEFLATE_LOOKAHEAD + 4)]
+
+    async def collect():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return [chunk async for chunk in archive.stream_zip(files, executor)]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(collect())
+    assert all(fileobj.closed for _, fileobj in files)
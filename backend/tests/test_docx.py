@@ -0,0 +1,66 @@
+import io
+import zipfile
+
+import pytest
+
+from app.services.processing import extract_text_from_docx_sync
+
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+APP_NS = "http://schemas.openxmlformats.org/officeDocument/2006/extended-properties"
+XXE_DTD = '<!DOCTYPE d [<!ENTITY x SYSTEM "file:///etc/hostname">]>'
+
+
+def _document(body: str, prolog: str = "") -> str:
+    return f'<?xml version="1.0"?>{prolog}<w:document xmlns:w="{W_NS}"><w:body>{body}</w:body></w:document>'
+
+
+def _app(pages: str, prolog: str = "") -> str:
+    return f'<?xml version="1.0"?>{prolog}<Properties xmlns="{APP_NS}"><Pages>{pages}</Pages></Properties>'
+
+
+def _docx(document: str, app: str = None) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("word/document.xml", document)
+        if app is not None:
+            zf.writestr("docProps/app.xml", app)
+    return buf.getvalue()
+
+
+def _paragraph(text: str) -> str:
+    return f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
+def test_text_and_page_count():
+    content = _docx(_document(_paragraph("Hello") + _paragraph("World")), _app("4"))
+    assert extract_text_from_docx_sync(content) == ("Hello\nWorld\n", 4)
+
+
+def test_tabs_and_breaks_become_whitespace():
+    run = "<w:r><w:t>Name:</w:t><w:tab/><w:t>John</w:t><w:br/><w:t>Street</w:t><w:cr/><w:t>1</w:t></w:r>"
+    # Tab stop definitions in the paragraph properties are not text
+    body = f'<w:p><w:pPr><w:tabs><w:tab w:val="left" w:pos="720"/></w:tabs></w:pPr>{run}</w:p>'
+    text, _ = extract_text_from_docx_sync(_docx(_document(body)))
+    assert text == "Name:\tJohn\nStreet\n1\n"
+
+
+def test_stops_after_50_paragraphs():
+    body = "".join(_paragraph(f"p{i}") for i in range(80))
+    text, _ = extract_text_from_docx_sync(_docx(_document(body)))
+    assert text.splitlines() == [f"p{i}" for i in range(50)]
+
+
+def test_document_with_doctype_is_rejected():
+    content = _docx(_document(_paragraph("leak &x;"), prolog=XXE_DTD), _app("1"))
+    with pytest.raises(ValueError):
+        extract_text_from_docx_sync(content)
+
+
+def test_app_properties_with_entity_give_no_page_count():
+    content = _docx(_document(_paragraph("Hello")), _app("&x;", prolog=XXE_DTD))
+    assert extract_text_from_docx_sync(content) == ("Hello\n", None)
+
+
+def test_missing_app_properties_give_no_page_count():
+    assert extract_text_from_docx_sync(_docx(_document(_paragraph("Hello")))) == ("Hello\n", None)
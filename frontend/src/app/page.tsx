@@ -11,7 +11,7 @@ export default function Home() {
   const [isUploading, setIsUploading] = useState(false);
   const [analysisData, setAnalysisData] = useState<any>(null);
   const [summaryData, setSummaryData] = useState<any>(null);
-  const [zipBase64, setZipBase64] = useState<string>("");
+  const [zipBlob, setZipBlob] = useState<Blob | null>(null);
   const [consent, setConsent] = useState(false);
   const [dragActive, setDragActive] = useState(false);
 
@@ -25,15 +25,18 @@ export default function Home() {
     });
 
     try {
-      const response = await axios.post(
-        `${process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000"}/api/upload`,
-        formData
-      );
+      const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+      const response = await axios.post(`${apiUrl}/api/upload`, formData, {
+        responseType: "blob",
+      });
+
+      // The zip is streamed as the response body; analysis is fetched separately
+      const analysis = await axios.get(`${apiUrl}${response.headers["x-analysis-url"]}`);
 
       // Store analysis, summary, and zip
-      setAnalysisData(response.data.analysis);
-      setSummaryData(response.data.summary);
-      setZipBase64(response.data.zip_file);
+      setAnalysisData(analysis.data.analysis);
+      setSummaryData(analysis.data.summary);
+      setZipBlob(response.data);
       
     } catch (error) {
       console.error("Upload failed", error);
@@ -72,7 +75,7 @@ export default function Home() {
     setFiles([]);
     setAnalysisData(null);
     setSummaryData(null);
-    setZipBase64("");
+    setZipBlob(null);
     setConsent(false);
   };
 
@@ -105,7 +108,7 @@ export default function Home() {
           <ResultsView 
             analysis={analysisData} 
             summary={summaryData}
-            zipBase64={zipBase64} 
+            zipBlob={zipBlob} 
             onReset={handleReset} 
           />
         ) : (
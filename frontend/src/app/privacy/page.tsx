@@ -18,7 +18,7 @@ export default function PrivacyPolicy() {
           Privacy Policy
         </h1>
         <p className="text-sm text-gray-500 mb-8">
-          Last updated: January 27, 2026
+          Last updated: October 14, 2026
         </p>
 
         <div className="space-y-8">
@@ -31,9 +31,10 @@ export default function PrivacyPolicy() {
               We operate on a strict "Zero Data Retention" principle. When you upload documents:
             </p>
             <ul className="list-disc pl-5 mt-2 text-sm text-gray-600 space-y-1">
-              <li>Files are processed entirely in volatile memory (RAM).</li>
-              <li>No file content is ever written to our disk storage.</li>
-              <li>Once the organization process is complete and the download stream finishes, the file data is immediately discarded from memory.</li>
+              <li>Files up to 512 KB are processed entirely in volatile memory (RAM).</li>
+              <li>Larger files are buffered in anonymous temporary files on the processing server's local disk while your request is handled. They are never written to our database or any persistent storage.</li>
+              <li>Once the organization process is complete and the download stream finishes (or the request is aborted), the file data is immediately discarded from memory and the temporary files are deleted.</li>
+              <li>To speed up re-uploads of identical files, the PII-scrubbed text extracts of the most recently processed files (at most 256) are kept in server memory only. They are never written to disk and are lost on every restart.</li>
             </ul>
           </section>
 
@@ -48,6 +49,7 @@ export default function PrivacyPolicy() {
             <ul className="list-disc pl-5 mt-2 text-sm text-gray-600 space-y-1">
               <li><strong>Hosting:</strong> Our core processing servers are located within the European Union (Amsterdam/France regions).</li>
               <li><strong>Metadata:</strong> We store only technical metadata (filenames, cluster categories, timestamps) in our database. We do not store the content of your documents.</li>
+              <li><strong>Embedding cache:</strong> The numeric embedding vectors computed from the PII-scrubbed text are cached for up to 7 days, keyed by a one-way hash of that text, so identical documents are not re-sent to the embedding provider. The text itself is not stored.</li>
             </ul>
           </section>
 
@@ -31,7 +31,7 @@ interface SummaryData {
 interface ResultsViewProps {
   analysis: AnalysisItem[];
   summary?: SummaryData;
-  zipBase64: string;
+  zipBlob: Blob | null;
   onReset: () => void;
 }
 
@@ -63,7 +63,7 @@ const CustomTooltip = ({ active, payload }: any) => {
   return null;
 };
 
-export default function ResultsView({ analysis, summary, zipBase64, onReset }: ResultsViewProps) {
+export default function ResultsView({ analysis, summary, zipBlob, onReset }: ResultsViewProps) {
   const [zoom, setZoom] = useState(1);
   const [center, setCenter] = useState({ x: 0, y: 0 });
   const [isDragging, setIsDragging] = useState(false);
@@ -71,14 +71,8 @@ export default function ResultsView({ analysis, summary, zipBase64, onReset }: R
   const chartContainerRef = useRef<HTMLDivElement>(null);
 
   const handleDownload = () => {
-    const byteCharacters = atob(zipBase64);
-    const byteNumbers = new Array(byteCharacters.length);
-    for (let i = 0; i < byteCharacters.length; i++) {
-      byteNumbers[i] = byteCharacters.charCodeAt(i);
-    }
-    const byteArray = new Uint8Array(byteNumbers);
-    const blob = new Blob([byteArray], { type: "application/zip" });
-    const url = URL.createObjectURL(blob);
+    if (!zipBlob) return;
+    const url = URL.createObjectURL(zipBlob);
     const link = document.createElement("a");
     link.href = url;
     link.download = "organized_documents.zip";